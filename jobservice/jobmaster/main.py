@@ -1,3 +1,4 @@
+import time
 import uuid
 from typing import List, Optional, Union
 from fastapi import FastAPI, HTTPException
@@ -8,6 +9,7 @@ from services.extract_comuna import extract_comuna
 from services.geo_api import geocode
 from services.properties_api import get_internal_properties
 from services.bedrooms import _parse_bedrooms
+from services.capture import CAPTURE_ENABLED, elapsed_ms
 
 app = FastAPI(title="JobMaster - Recommendations", version="1.0.0")
 
@@ -59,11 +61,13 @@ def heartbeat():
 def create_job(payload: JobCreateIn):
     # dump con alias para conservar "beedrooms" si viene así
     p = payload.property.model_dump(by_alias=True)
+    timings = {}
 
     # 1) Determinar string de ubicación (location/name)
     location_str = p.get("location") or p.get("name")
 
     # 2) Extraer comuna - intentar de múltiples fuentes
+    t0 = time.perf_counter()
     comuna = None
     if location_str:
         comuna = extract_comuna(location_str)
@@ -75,6 +79,7 @@ def create_job(payload: JobCreateIn):
     # Si no se pudo extraer de location, intentar de otros campos posibles
     if not comuna and p.get("address"):
         comuna = extract_comuna(p.get("address"))
+    timings["extract_comuna_ms"] = elapsed_ms(t0)
 
     # 3) Normalizar dormitorios: primero bedrooms, luego beedrooms
     bedrooms_raw = p.get("bedrooms")
@@ -87,9 +92,11 @@ def create_job(payload: JobCreateIn):
     price = _as_float(p.get("price"))
 
     # 5) Geocoding si falta lat/lon y tenemos string de ubicación
+    t0 = time.perf_counter()
     g = None
     if (p.get("lat") is None or p.get("lon") is None) and location_str:
         g = geocode(location_str)
+    timings["geocode_ms"] = elapsed_ms(t0)
     if g is not None:
         p["lat"], p["lon"] = g["lat"], g["lon"]
 
@@ -103,6 +110,11 @@ def create_job(payload: JobCreateIn):
         "lon": p.get("lon"),
         "raw": p,
     }
+
+    # Modo captura: viajan los tiempos del JobMaster para que el worker
+    # los guarde junto al resto del job (ver services/capture.py)
+    if CAPTURE_ENABLED:
+        derived["_capture"] = {"enqueued_at": time.time(), "timings": timings}
     
     # Log para debugging
     print(f"[JobMaster] Creating job for property:")
@@ -0,0 +1,201 @@
+import os
+import glob
+import gzip
+import json
+import time
+import socket
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+# --- configuración (opt-in vía env) ---
+CAPTURE_ENABLED = os.getenv("JOB_CAPTURE", "0").lower() in ("1", "true", "yes")
+CAPTURE_DIR = os.getenv("JOB_CAPTURE_DIR", "/app/captures")
+CAPTURE_MAX_BYTES = int(os.getenv("JOB_CAPTURE_MAX_BYTES", str(20 * 1024 * 1024)))
+CAPTURE_BACKUPS = int(os.getenv("JOB_CAPTURE_BACKUPS", "5"))
+
+_write_lock = threading.Lock()
+
+# versiones de catálogo ya calculadas en este proceso: fingerprint -> version.
+# En modo scatter cada shard versiona página por página, así que el cache
+# tiene que alcanzar para todas las páginas de un shard.
+CATALOG_VERSION_CACHE = int(os.getenv("JOB_CAPTURE_VERSION_CACHE", "256"))
+_catalog_versions: "OrderedDict[int, str]" = OrderedDict()
+_versions_lock = threading.Lock()
+
+
+# ---------------- timings ---------------- #
+
+def elapsed_ms(t0: float) -> float:
+    """Milisegundos desde t0 (time.perf_counter())."""
+    return round((time.perf_counter() - t0) * 1000, 3)
+
+
+@contextmanager
+def stage(timings: Dict[str, float], name: str):
+    """Mide el bloque y guarda los milisegundos en timings[name]."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = elapsed_ms(t0)
+
+
+# ---------------- catálogo ---------------- #
+
+# campos que lee basic_filter_and_rank: si cambia alguno, cambia la versión
+_FINGERPRINT_FIELDS = ("id", "name", "location", "bedrooms", "price", "lat", "lon")
+
+
+def _fingerprint(props: List[Dict[str, Any]]) -> int:
+    # barato comparado con json.dumps + sha1 de todo el catálogo
+    rows = tuple(
+        tuple(p.get(f) for f in _FINGERPRINT_FIELDS)
+        for p in props
+    )
+    try:
+        return hash((len(props), rows))
+    except TypeError:
+        return hash((len(props), repr(rows)))
+
+
+def catalog_version(props: List[Dict[str, Any]]) -> str:
+    """Hash estable del catálogo: mismo contenido -> misma versión.
+
+    El hash completo se calcula solo cuando cambia el fingerprint (los
+    campos que usa el ranking); si el catálogo (o la página) ya se vio en
+    este proceso se reutiliza la versión.
+    """
+    fp = _fingerprint(props)
+    with _versions_lock:
+        version = _catalog_versions.get(fp)
+        if version is not None:
+            _catalog_versions.move_to_end(fp)
+            return version
+    raw = json.dumps(props, sort_keys=True, ensure_ascii=False, default=str)
+    version = hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+    with _versions_lock:
+        _catalog_versions[fp] = version
+        while len(_catalog_versions) > CATALOG_VERSION_CACHE:
+            _catalog_versions.popitem(last=False)
+    return version
+
+
+def pages_version(page_versions: List[str]) -> str:
+    """Versión de un catálogo guardado por páginas (modo scatter)."""
+    raw = ",".join(page_versions)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def catalog_path(version: str, directory: Optional[str] = None) -> str:
+    return os.path.join(directory or CAPTURE_DIR, f"catalog-{version}.json.gz")
+
+
+def save_catalog(version: str, props: List[Dict[str, Any]]) -> str:
+    """Guarda el snapshot del catálogo una sola vez por versión."""
+    path = catalog_path(version)
+    if os.path.exists(path):
+        return path
+    os.makedirs(CAPTURE_DIR, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        json.dump(props, f, ensure_ascii=False, default=str)
+    os.replace(tmp, path)
+    return path
+
+
+def snapshot_catalog(props: List[Dict[str, Any]]) -> Optional[str]:
+    """Versión + snapshot del catálogo; ante error devuelve None y el job sigue."""
+    try:
+        version = catalog_version(props)
+        save_catalog(version, props)
+        return version
+    except Exception as e:
+        print(f"[Capture] error saving catalog snapshot: {e}")
+        return None
+
+
+def load_catalog(path: str) -> List[Dict[str, Any]]:
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ---------------- jobs ---------------- #
+
+def _capture_file() -> str:
+    # un archivo por proceso: los workers prefork no comparten handle
+    name = f"jobs-{socket.gethostname()}-{os.getpid()}.jsonl.gz"
+    return os.path.join(CAPTURE_DIR, name)
+
+
+def _rotate(path: str) -> None:
+    for i in range(CAPTURE_BACKUPS - 1, 0, -1):
+        src, dst = f"{path}.{i}", f"{path}.{i + 1}"
+        if os.path.exists(src):
+            os.replace(src, dst)
+    if CAPTURE_BACKUPS > 0:
+        os.replace(path, f"{path}.1")
+    else:
+        os.remove(path)
+
+
+def capture_job(record: Dict[str, Any]) -> None:
+    """Agrega un registro al JSONL comprimido, rotando por tamaño.
+
+    Cada línea se escribe como un miembro gzip independiente, así un
+    proceso que muere a medio camino no corrompe lo ya capturado.
+    Nunca levanta excepción: capturar no puede botar un job.
+    """
+    try:
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        path = _capture_file()
+        with _write_lock:
+            os.makedirs(CAPTURE_DIR, exist_ok=True)
+            if os.path.exists(path) and os.path.getsize(path) >= CAPTURE_MAX_BYTES:
+                _rotate(path)
+            with gzip.open(path, "at", encoding="utf-8") as f:
+                f.write(line)
+    except Exception as e:
+        print(f"[Capture] error writing record: {e}")
+
+
+def iter_jobs(paths: List[str], errors: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+    """Lee registros de uno o más archivos/directorios, ordenados por ts.
+
+    Un archivo cortado (proceso que murió escribiendo) o una línea ilegible
+    no botan la lectura: se guardan los registros ya leídos, el problema se
+    loguea y se agrega a errors si se pasa.
+    """
+    files: List[str] = []
+    for p in paths:
+        if os.path.isdir(p):
+            files.extend(glob.glob(os.path.join(p, "jobs-*.jsonl.gz*")))
+        else:
+            files.extend(glob.glob(p) or [p])
+
+    records: List[Dict[str, Any]] = []
+    for path in sorted(set(files)):
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for n, line in enumerate(f, start=1):
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError as e:
+                        msg = f"{path}:{n}: bad record ({e})"
+                        print(f"[Capture] {msg}")
+                        if errors is not None:
+                            errors.append(msg)
+        except (EOFError, OSError, zlib.error, UnicodeDecodeError) as e:
+            msg = f"{path}: truncated or corrupt, kept records read so far ({e})"
+            print(f"[Capture] {msg}")
+            if errors is not None:
+                errors.append(msg)
+    records.sort(key=lambda r: r.get("ts") or 0.0)
+    return iter(records)
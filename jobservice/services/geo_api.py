@@ -9,6 +9,9 @@ _cache_lock = threading.Lock()
 _last_nominatim_call = 0.0
 _rl_lock = threading.Lock()
 
+# --- registro de consultas (para captura/replay) ---
+_recording = threading.local()
+
 def _cache_get(addr: str) -> Optional[Dict[str, Any]]:
     key = addr.strip().lower()
     with _cache_lock:
@@ -19,6 +22,21 @@ def _cache_put(addr: str, data: Dict[str, Any]) -> None:
     with _cache_lock:
         _cache[key] = data
 
+def start_recording() -> None:
+    """Empieza a registrar las consultas de geocode() del hilo actual."""
+    _recording.log = {}
+
+def stop_recording() -> Dict[str, Any]:
+    """Devuelve {direccion_normalizada: resultado} y deja de registrar."""
+    log = getattr(_recording, "log", None) or {}
+    _recording.log = None
+    return log
+
+def _record(addr: str, geo: Optional[Dict[str, Any]]) -> None:
+    log = getattr(_recording, "log", None)
+    if log is not None:
+        log[addr.strip().lower()] = geo
+
 def geocode_nominatim(addr: str) -> Optional[Dict[str, Any]]:
     global _last_nominatim_call
     # throttle 1 req/s
@@ -79,6 +97,7 @@ def geocode(addr: str) -> Optional[Dict[str, Any]]:
     # cache hit
     c = _cache_get(addr)
     if c:
+        _record(addr, c)
         return c
 
     # elige proveedor según env
@@ -98,6 +117,7 @@ def geocode(addr: str) -> Optional[Dict[str, Any]]:
 
     if geo:
         _cache_put(addr, geo)
+    _record(addr, geo)
     return geo
 
 
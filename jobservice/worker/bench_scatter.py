@@ -0,0 +1,158 @@
+"""
+Benchmark del scatter-gather de tasks.recommend.
+
+Corre el mismo job en una pasada y repartido en 1, 3 y N procesos (uno
+por shard, como si fueran workers libres) y verifica que el top k sea
+idéntico. El catálogo se sirve como páginas JSON ya codificadas (lo que
+devolvería la API), así ambos caminos pagan el decode de sus páginas:
+
+- single_ms: decode de todas las páginas + basic_filter_and_rank
+- rank_ms: shards en paralelo (decode de sus páginas + ranking) + merge
+- serialize_ms / deserialize_ms: JSON de lo que viaja por Redis, es
+  decir los argumentos de cada shard y sus top k, medido en serie
+
+speedup = single_ms / (rank_ms + serialize_ms + deserialize_ms). No
+incluye la latencia de red del broker ni de la API.
+
+Uso (dentro del contenedor worker, WORKDIR /app/worker):
+
+    python bench_scatter.py                         # catálogo sintético de 50000
+    python bench_scatter.py --size 200000 --workers 1 3 8
+    python bench_scatter.py --catalog /app/captures/catalog-<version>.json.gz
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import contextlib
+from multiprocessing import Pool
+from typing import Any, Dict, List, Optional
+
+import worker
+from services import capture
+
+COMUNAS_BENCH = ["Ñuñoa", "Providencia", "Las Condes", "La Florida", "Macul", "Santiago", "Maipú"]
+
+
+def synthetic_catalog(size: int, seed: int = 42) -> List[Dict[str, Any]]:
+    rnd = random.Random(seed)
+    props = []
+    for i in range(size):
+        comuna = rnd.choice(COMUNAS_BENCH)
+        props.append({
+            "id": i,
+            "name": f"Departamento {i}, {comuna}, Chile",
+            "location": f"Calle {rnd.randint(1, 9999)}, {comuna}, Región Metropolitana",
+            "bedrooms": f"{rnd.randint(1, 4)} dormitorios",
+            "price": rnd.randint(50, 500) * 1000,
+            "lat": -33.45 + rnd.uniform(-0.1, 0.1),
+            "lon": -70.65 + rnd.uniform(-0.1, 0.1),
+        })
+    return props
+
+
+def api_pages(props: List[Dict[str, Any]]) -> List[str]:
+    """El catálogo partido en páginas JSON de FETCH_PAGE_LIMIT filas."""
+    limit = worker.FETCH_PAGE_LIMIT
+    return [json.dumps({"results": props[i:i + limit]}) for i in range(0, len(props), limit)]
+
+
+# "la API": cada proceso del pool la recibe una sola vez (no se cronometra)
+_BASE: Dict[str, Any] = {}
+_PAGES: List[str] = []
+
+
+def _init_pool(base, pages):
+    global _BASE, _PAGES
+    _BASE, _PAGES = base, pages
+
+
+def _rank(base, props):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return worker.basic_filter_and_rank(base, props)
+
+
+def _rank_shard(args):
+    # mismo reparto que fetch_shard_pages: páginas shard+1, shard+1+n, ...
+    shard, n_shards = args
+    props: List[Dict[str, Any]] = []
+    for idx in range(shard, len(_PAGES), n_shards):
+        rows = worker._page_results(json.loads(_PAGES[idx]))
+        worker._tag_rows(idx + 1, rows)
+        props.extend(rows)
+    return _rank(_BASE, props)
+
+
+def _ids(recos: List[Dict[str, Any]]) -> List[Any]:
+    return [p.get("id") for p in recos]
+
+
+def run(props: List[Dict[str, Any]], base: Dict[str, Any], workers: List[int], repeat: int) -> int:
+    pages = api_pages(props)
+
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        catalog = [p for page in pages for p in worker._page_results(json.loads(page))]
+        expected = _rank(base, catalog)
+    single_ms = (time.perf_counter() - t0) * 1000 / repeat
+
+    print(f"catalog={len(props)} pages={len(pages)} base={{comuna={base['comuna']}, dormitorios={base['dormitorios']}, price={base['price']}}}")
+    print(f"single pass: {single_ms:.1f} ms -> {_ids(expected)}\n")
+    print(f"{'workers':>7} {'rank_ms':>10} {'serialize_ms':>13} {'deserialize_ms':>15} {'speedup':>8}  same_result")
+
+    mismatches = 0
+    for n in workers:
+        args = [(shard, n) for shard in range(n)]
+        with Pool(n, initializer=_init_pool, initargs=(base, pages)) as pool:
+            pool.map(_rank_shard, args)  # calentar procesos
+            t0 = time.perf_counter()
+            for _ in range(repeat):
+                shard_results = pool.map(_rank_shard, args)
+                got = worker.merge_top_k(shard_results)
+            rank_ms = (time.perf_counter() - t0) * 1000 / repeat
+
+        # mensajes del chord: argumentos de cada shard y sus top k
+        messages = [[base, shard, n] for shard, n in args] + shard_results
+        t0 = time.perf_counter()
+        encoded = [json.dumps(m) for m in messages]
+        serialize_ms = (time.perf_counter() - t0) * 1000
+        t0 = time.perf_counter()
+        for m in encoded:
+            json.loads(m)
+        deserialize_ms = (time.perf_counter() - t0) * 1000
+
+        same = _ids(got) == _ids(expected)
+        mismatches += 0 if same else 1
+        speedup = single_ms / (rank_ms + serialize_ms + deserialize_ms)
+        print(f"{n:>7} {rank_ms:>10.1f} {serialize_ms:>13.2f} {deserialize_ms:>15.2f} {speedup:>7.2f}x  {same}")
+    return 1 if mismatches else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark scatter-gather de recomendaciones")
+    parser.add_argument("--size", type=int, default=50000, help="tamaño del catálogo sintético")
+    parser.add_argument("--catalog", default=None, help="usar un catálogo capturado en vez del sintético")
+    parser.add_argument("--workers", type=int, nargs="+", default=None,
+                        help="cantidades de workers a probar (por defecto 1 3 N=cpu_count)")
+    parser.add_argument("--comuna", default=COMUNAS_BENCH[0], help="comuna de la propiedad base")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    props = capture.load_catalog(args.catalog) if args.catalog else synthetic_catalog(args.size)
+    workers = args.workers or sorted({1, 3, os.cpu_count() or 1})
+    base = {
+        "property_id": None,
+        "comuna": args.comuna,
+        "dormitorios": 2,
+        "price": 300000,
+        "lat": -33.45,
+        "lon": -70.65,
+    }
+    return run(props, base, workers, args.repeat)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# mismo layout que el contenedor (PYTHONPATH=/app): services/ al lado de worker/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,198 @@
+"""
+Replay de jobs capturados (JOB_CAPTURE=1) contra basic_filter_and_rank.
+
+Uso (dentro del contenedor worker, WORKDIR /app/worker):
+
+    python replay.py /app/captures                 # ritmo original
+    python replay.py /app/captures --speed 10      # 10x más rápido
+    python replay.py /app/captures --speed 0       # sin pausas
+    python replay.py jobs-*.jsonl.gz --catalog catalog-<version>.json.gz
+
+Por defecto cada job usa el snapshot de catálogo de su versión y las
+respuestas de geocode que se registraron al capturarlo, así el replay es
+determinista y no sale a la red. Con --online se geocodifica de verdad.
+
+Los jobs capturados en modo scatter se re-ejecutan shard por shard (mismo
+reparto de páginas) y se juntan con merge_top_k; su rank_ms es el del
+shard más lento y se reporta aparte de los jobs de una sola pasada.
+"""
+import io
+import os
+import sys
+import time
+import math
+import argparse
+import contextlib
+from typing import Any, Dict, List, Optional
+
+import worker
+from services import capture
+
+
+def _percentile(sorted_vals: List[float], q: float) -> float:
+    if not sorted_vals:
+        return float("nan")
+    idx = min(len(sorted_vals) - 1, max(0, math.ceil(q / 100 * len(sorted_vals)) - 1))
+    return sorted_vals[idx]
+
+
+def _summary(vals: List[float]) -> str:
+    if not vals:
+        return "n=0"
+    s = sorted(vals)
+    return (
+        f"n={len(s)} mean={sum(s) / len(s):.2f} p50={_percentile(s, 50):.2f} "
+        f"p90={_percentile(s, 90):.2f} p99={_percentile(s, 99):.2f} max={s[-1]:.2f}"
+    )
+
+
+def _same_result(a: List[Dict[str, Any]], b: List[Dict[str, Any]]) -> bool:
+    if [x.get("id") for x in a] != [x.get("id") for x in b]:
+        return False
+    for x, y in zip(a, b):
+        dx, dy = x.get("distance_km"), y.get("distance_km")
+        if dx is None or dy is None:
+            if dx != dy:
+                return False
+        elif not math.isclose(dx, dy, rel_tol=1e-9, abs_tol=1e-9):
+            return False
+    return True
+
+
+def _replay_scatter(payload: Dict[str, Any],
+                    pages: List[List[Dict[str, Any]]],
+                    n_shards: int):
+    """Igual que recommend_shard + recommend_merge: devuelve (recos, ms del shard más lento)."""
+    shard_recos = []
+    shard_ms = []
+    for shard in range(n_shards):
+        props: List[Dict[str, Any]] = []
+        for idx in range(shard, len(pages), n_shards):
+            rows = [dict(p) for p in pages[idx]]
+            worker._tag_rows(idx + 1, rows)
+            props.extend(rows)
+        t0 = time.perf_counter()
+        shard_recos.append(worker.basic_filter_and_rank(payload, props))
+        shard_ms.append((time.perf_counter() - t0) * 1000)
+    return worker.merge_top_k(shard_recos), max(shard_ms)
+
+
+def replay(paths: List[str],
+           speed: float = 1.0,
+           catalog_file: Optional[str] = None,
+           catalog_dir: Optional[str] = None,
+           online: bool = False,
+           verbose: bool = False) -> int:
+    catalogs: Dict[str, List[Dict[str, Any]]] = {}
+    if catalog_dir is None:
+        # los catálogos se guardan junto a los jobs capturados
+        catalog_dir = paths[0] if os.path.isdir(paths[0]) else os.path.dirname(paths[0]) or "."
+    if catalog_file:
+        fixed_catalog = capture.load_catalog(catalog_file)
+
+    # mode -> (rank_ms original, rank_ms replay)
+    latencies: Dict[str, tuple] = {"single": ([], []), "scatter": ([], [])}
+    diffs: List[Dict[str, Any]] = []
+    read_errors: List[str] = []
+    skipped = 0
+    total = 0
+
+    wall_start = time.perf_counter()
+    first_ts = None
+    for rec in capture.iter_jobs(paths, errors=read_errors):
+        # ritmo: respetar la separación original entre jobs / speed
+        ts = rec.get("ts") or 0.0
+        if first_ts is None:
+            first_ts = ts
+        if speed > 0:
+            wait = (ts - first_ts) / speed - (time.perf_counter() - wall_start)
+            if wait > 0:
+                time.sleep(wait)
+
+        scatter = False
+        if catalog_file:
+            props = fixed_catalog
+        else:
+            # en modo scatter el catálogo quedó guardado por páginas
+            versions = rec.get("catalog_pages") or [rec.get("catalog_version")]
+            missing = [
+                capture.catalog_path(v, catalog_dir) for v in versions
+                if v not in catalogs and not os.path.exists(capture.catalog_path(v, catalog_dir))
+            ]
+            if missing:
+                print(f"[Replay] skip job {rec.get('job_id')}: missing {missing[0]}")
+                skipped += 1
+                continue
+            for v in versions:
+                if v not in catalogs:
+                    catalogs[v] = capture.load_catalog(capture.catalog_path(v, catalog_dir))
+            pages = [catalogs[v] for v in versions]
+            props = [p for rows in pages for p in rows]
+            scatter = rec.get("mode") == "scatter" and bool(rec.get("catalog_pages"))
+
+        if not online:
+            geocache = rec.get("geocache") or {}
+            worker.geocode = lambda addr, _g=geocache: _g.get(addr.strip().lower())
+
+        # los prints de basic_filter_and_rank se silencian salvo --verbose
+        out = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+        timings = rec.get("timings") or {}
+        with out:
+            if scatter:
+                n_shards = len(timings.get("shard_rank_ms") or []) or 1
+                recos, elapsed = _replay_scatter(rec.get("payload") or {}, pages, n_shards)
+            else:
+                t0 = time.perf_counter()
+                recos = worker.basic_filter_and_rank(rec.get("payload") or {}, props)
+                elapsed = (time.perf_counter() - t0) * 1000
+        total += 1
+
+        original_ms, replay_ms = latencies["scatter" if scatter else "single"]
+        replay_ms.append(elapsed)
+        if timings.get("rank_ms") is not None:
+            original_ms.append(timings["rank_ms"])
+
+        got = [{"id": p.get("id"), "distance_km": p.get("_distance_km")} for p in recos]
+        expected = rec.get("result") or []
+        if not _same_result(expected, got):
+            diffs.append({"job_id": rec.get("job_id"), "expected": expected, "got": got})
+
+    print("\n===== Replay =====")
+    print(f"jobs replayed: {total}, skipped: {skipped}, speed: {speed or 'max'}")
+    if read_errors:
+        print(f"capture read errors: {len(read_errors)} (see [Capture] lines above)")
+    for mode, (original_ms, replay_ms) in latencies.items():
+        if not replay_ms:
+            continue
+        print(f"[{mode}] rank_ms original: {_summary(original_ms)}")
+        print(f"[{mode}] rank_ms replay:   {_summary(replay_ms)}")
+    print(f"result diffs: {len(diffs)}")
+    for d in diffs:
+        print(f"  - job {d['job_id']}: expected={d['expected']} got={d['got']}")
+    if total == 0:
+        print("[Replay] no job was replayed")
+        return 1
+    return 1 if diffs else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay de jobs capturados")
+    parser.add_argument("paths", nargs="+", help="archivos jobs-*.jsonl.gz o directorios de captura")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="factor de aceleración (1 = ritmo original, 0 = sin pausas)")
+    parser.add_argument("--catalog", default=None,
+                        help="usar este catálogo guardado para todos los jobs")
+    parser.add_argument("--catalog-dir", default=None,
+                        help="directorio con catalog-<version>.json.gz (por defecto junto a los jobs capturados)")
+    parser.add_argument("--online", action="store_true",
+                        help="geocodificar de verdad en vez de usar las respuestas capturadas")
+    parser.add_argument("--verbose", action="store_true",
+                        help="mostrar los logs de basic_filter_and_rank")
+    args = parser.parse_args(argv)
+    return replay(args.paths, speed=args.speed, catalog_file=args.catalog,
+                  catalog_dir=args.catalog_dir, online=args.online,
+                  verbose=args.verbose)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+import copy
+import random
+
+import pytest
+
+import worker
+
+LIMIT = worker.FETCH_PAGE_LIMIT
+
+
+def _catalog(size, seed=0):
+    rnd = random.Random(seed)
+    props = []
+    for i in range(size):
+        comuna = rnd.choice(["Ñuñoa", "Providencia", "Macul"])
+        p = {
+            "id": i,
+            "name": f"Depto {i}, {comuna}",
+            "location": f"Calle {i}, {comuna}, Chile",
+            "bedrooms": f"{rnd.randint(1, 3)} dormitorios",
+            "price": rnd.randint(50, 500) * 1000,
+            "lat": -33.45 + rnd.uniform(-0.1, 0.1),
+            "lon": -70.65 + rnd.uniform(-0.1, 0.1),
+        }
+        r = rnd.random()
+        if r < 0.2:
+            # sin coordenadas (geocode mockeado devuelve None)
+            p["lat"] = p["lon"] = None
+        elif r < 0.4:
+            # empates exactos en (distancia, precio)
+            p["lat"], p["lon"], p["price"] = -33.45, -70.65, 200000
+        props.append(p)
+    return props
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """Mockea la API paginada y el geocoder; devuelve el setter del catálogo."""
+    state = {"props": []}
+
+    def get_internal_properties(page=1, limit=LIMIT):
+        rows = state["props"][(page - 1) * limit:page * limit]
+        return {"results": copy.deepcopy(rows)}
+
+    monkeypatch.setattr(worker, "get_internal_properties", get_internal_properties)
+    monkeypatch.setattr(worker, "geocode", lambda addr: None)
+    monkeypatch.setattr(worker, "_scatter_probe", None)
+
+    def set_catalog(props):
+        state["props"] = props
+    return set_catalog
+
+
+BASES = [
+    {"property_id": None, "comuna": "Ñuñoa", "dormitorios": 2, "price": 300000, "lat": -33.45, "lon": -70.65},
+    {"property_id": None, "comuna": "Ñuñoa", "dormitorios": 2, "price": 300000, "lat": None, "lon": None},
+    {"property_id": 5, "comuna": "Macul", "dormitorios": None, "price": None, "lat": -33.45, "lon": -70.65},
+    {"property_id": None, "comuna": None, "dormitorios": 2, "price": 1, "lat": 0, "lon": 0},
+]
+
+
+@pytest.mark.parametrize("base", BASES)
+@pytest.mark.parametrize("n_shards", [1, 2, 3, 5, 17])
+def test_merge_matches_single_pass(api, base, n_shards):
+    props = _catalog(3 * LIMIT + 137)
+    api(props)
+
+    expected = worker.basic_filter_and_rank(base, worker.fetch_all_properties())
+    shard_results = [
+        worker.recommend_shard.run(base, shard, n_shards)["recommendations"]
+        for shard in range(n_shards)
+    ]
+    got = worker.merge_top_k(shard_results)
+
+    assert [p["id"] for p in got] == [p["id"] for p in expected]
+    assert [p["_distance_km"] for p in got] == [p["_distance_km"] for p in expected]
+
+
+def test_merge_all_without_coordinates(api):
+    props = _catalog(2 * LIMIT)
+    for p in props:
+        p["lat"] = p["lon"] = None
+    api(props)
+    base = BASES[0]
+
+    expected = worker.basic_filter_and_rank(base, worker.fetch_all_properties())
+    shard_results = [worker.recommend_shard.run(base, s, 3)["recommendations"] for s in range(3)]
+
+    assert expected and all(p["_distance_km"] is None for p in expected)
+    assert [p["id"] for p in worker.merge_top_k(shard_results)] == [p["id"] for p in expected]
+
+
+def test_merge_ties_follow_catalog_order(api):
+    # empates solo en las páginas 2 y 4: con 3 shards la página 4 cae en el
+    # shard 0, así que el orden de llegada de los shards no basta
+    props = _catalog(4 * LIMIT, seed=1)
+    for p in props:
+        p["location"] = f"Calle {p['id']}, Macul, Chile"
+    for page in (2, 4):
+        for p in props[(page - 1) * LIMIT:(page - 1) * LIMIT + 5]:
+            p.update(location=f"Calle {p['id']}, Ñuñoa, Chile", bedrooms="2",
+                     lat=-33.45, lon=-70.65, price=200000)
+    api(props)
+    base = BASES[0]
+
+    expected = worker.basic_filter_and_rank(base, worker.fetch_all_properties())
+    shard_results = [worker.recommend_shard.run(base, s, 3)["recommendations"] for s in range(3)]
+
+    assert [p["id"] for p in expected] == [LIMIT, LIMIT + 1, LIMIT + 2]
+    assert [p["id"] for p in worker.merge_top_k(shard_results)] == [p["id"] for p in expected]
+
+
+@pytest.mark.parametrize("threshold, expected", [(1199, True), (1200, True), (1201, False)])
+def test_use_scatter_threshold(api, monkeypatch, threshold, expected):
+    api(_catalog(1200))
+    monkeypatch.setattr(worker, "SCATTER_SHARDS", 3)
+    monkeypatch.setattr(worker, "SCATTER_MIN_CATALOG", threshold)
+
+    assert worker._use_scatter() is expected
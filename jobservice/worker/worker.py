@@ -1,11 +1,13 @@
 import os
 import math
-from typing import List, Dict, Any
-from celery import Celery
+import time
+from typing import List, Dict, Any, Optional, Tuple
+from celery import Celery, chord, group
 from services.properties_api import get_internal_properties
 from services.extract_comuna import extract_comuna
 from services.geo_api import geocode
 from services.bedrooms import _parse_bedrooms
+from services import capture, geo_api
 
 BROKER_URL = os.getenv("BROKER_URL", "redis://redis:6379/0")
 RESULT_BACKEND = os.getenv("RESULT_BACKEND", "redis://redis:6379/1")
@@ -13,6 +15,19 @@ RESULT_BACKEND = os.getenv("RESULT_BACKEND", "redis://redis:6379/1")
 celery = Celery("reco", broker=BROKER_URL, backend=RESULT_BACKEND)
 celery.conf.task_default_queue = "reco"
 
+# cantidad de recomendaciones que se devuelven
+TOP_K = 3
+# tamaño de página al leer el catálogo desde la API
+FETCH_PAGE_LIMIT = 500
+# scatter-gather: sobre este tamaño de catálogo se reparte en SCATTER_SHARDS tareas
+SCATTER_MIN_CATALOG = int(os.getenv("RECO_SCATTER_MIN_CATALOG", "10000"))
+SCATTER_SHARDS = int(os.getenv("RECO_SCATTER_SHARDS", "3"))
+# segundos que se reutiliza el resultado de la página de prueba en cada proceso
+SCATTER_PROBE_TTL = float(os.getenv("RECO_SCATTER_PROBE_TTL", "60"))
+
+# último resultado de _use_scatter: (momento, usar scatter)
+_scatter_probe: Optional[Tuple[float, bool]] = None
+
 
 # ---------------- helpers ---------------- #
 
@@ -26,20 +41,24 @@ def haversine_km(lat1, lon1, lat2, lon2):
     return R * c
 
 
+def _page_results(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    # soportar distintas llaves posibles en la API
+    return (
+        data.get("results")
+        or data.get("data")
+        or data.get("items")
+        or []
+    )
+
+
 def fetch_all_properties() -> List[Dict[str, Any]]:
     all_results: List[Dict[str, Any]] = []
     page = 1
-    limit = 500
+    limit = FETCH_PAGE_LIMIT
     pages_fetched = 0
     while True:
         data = get_internal_properties(page=page, limit=limit)
-        # soportar distintas llaves posibles en la API
-        results = (
-            data.get("results")
-            or data.get("data")
-            or data.get("items")
-            or []
-        )
+        results = _page_results(data)
         count = len(results)
         print(f"[Worker] fetch_all_properties: page={page}, got={count}")
         if count == 0:
@@ -64,7 +83,8 @@ def _safe_float(x, default=0.0):
 # ---------------- ranking ---------------- #
 
 def basic_filter_and_rank(base: Dict[str, Any],
-                          props: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+                          props: List[Dict[str, Any]],
+                          k: int = TOP_K) -> List[Dict[str, Any]]:
     """
     1) Obtener comuna, dormitorios, precio y ubicación de la propiedad base.
     2) Filtrar propiedades del sistema con:
@@ -74,7 +94,7 @@ def basic_filter_and_rank(base: Dict[str, Any],
     3) Ordenar por:
        - distancia geográfica a la propiedad base
        - luego por precio (menor a mayor)
-    4) Devolver a lo más 3 coincidencias. Si no hay, lista vacía.
+    4) Devolver a lo más k (3) coincidencias. Si no hay, lista vacía.
     """
 
     base_comuna = (base.get("comuna") or "").strip().lower()
@@ -178,7 +198,7 @@ def basic_filter_and_rank(base: Dict[str, Any],
         for p in candidates:
             p["_distance_km"] = None
         candidates.sort(key=lambda x: _safe_float(x.get("price"), float("inf")))
-        return candidates[:3]
+        return candidates[:k]
 
     # Tengo lat/lon base → calculo distancias
     enriched: List[Dict[str, Any]] = []
@@ -219,7 +239,7 @@ def basic_filter_and_rank(base: Dict[str, Any],
         for p in candidates:
             p["_distance_km"] = None
         candidates.sort(key=lambda x: _safe_float(x.get("price"), float("inf")))
-        return candidates[:3]
+        return candidates[:k]
 
     # Orden final: primero distancia, luego precio
     enriched_valid.sort(
@@ -229,13 +249,13 @@ def basic_filter_and_rank(base: Dict[str, Any],
         )
     )
 
-    return enriched_valid[:3]
+    return enriched_valid[:k]
 
 
 # ---------------- task Celery ---------------- #
 
-@celery.task(name="tasks.recommend")
-def recommend(base_property: Dict[str, Any]):
+@celery.task(name="tasks.recommend", bind=True)
+def recommend(self, base_property: Dict[str, Any]):
     """
     base_property viene desde JobMaster así:
 
@@ -248,10 +268,220 @@ def recommend(base_property: Dict[str, Any]):
       "lon": ...,
       "raw": { ... payload original ... }
     }
+
+    Si el catálogo tiene al menos SCATTER_MIN_CATALOG propiedades, la
+    tarea se reemplaza por un chord: cada shard lee y rankea sus propias
+    páginas en cualquier worker libre y recommend_merge arma el top k global.
+    """
+    if not capture.CAPTURE_ENABLED:
+        if _use_scatter():
+            return self.replace(_scatter(base_property))
+        all_props = fetch_all_properties()
+        recos = basic_filter_and_rank(base_property, all_props)
+        return _format_recommendations(recos)
+
+    # ---- modo captura ----
+    meta = base_property.get("_capture") or {}
+    payload = {k: v for k, v in base_property.items() if k != "_capture"}
+    timings = dict(meta.get("timings") or {})
+    started_at = time.time()
+    if meta.get("enqueued_at"):
+        timings["queue_wait_ms"] = round((started_at - meta["enqueued_at"]) * 1000, 3)
+
+    record = {
+        "ts": started_at,
+        "job_id": self.request.id,
+        "payload": payload,
+        "timings": timings,
+    }
+    if _use_scatter():
+        return self.replace(_scatter(payload, record))
+
+    with capture.stage(timings, "fetch_ms"):
+        all_props = fetch_all_properties()
+    record["catalog_version"] = capture.snapshot_catalog(all_props)
+    record["catalog_size"] = len(all_props)
+
+    geo_api.start_recording()
+    try:
+        with capture.stage(timings, "rank_ms"):
+            recos = basic_filter_and_rank(payload, all_props)
+    finally:
+        geocache = geo_api.stop_recording()
+    timings["total_ms"] = round((time.time() - started_at) * 1000, 3)
+
+    record["geocache"] = geocache
+    record["result"] = _result_ids(recos)
+    capture.capture_job(record)
+    return _format_recommendations(recos)
+
+
+# ---------------- scatter-gather ---------------- #
+#
+# Por el broker solo viajan el payload, el número de shard y los top k
+# locales: cada shard lee sus propias páginas de la API. El shard i toma
+# las páginas i+1, i+1+n, i+1+2n, ... hasta la primera página incompleta.
+# Cada fila lleva "_row" (su posición en el catálogo) para desempatar
+# igual que una pasada sobre el catálogo completo.
+
+def _use_scatter() -> bool:
+    """
+    True si el catálogo tiene al menos SCATTER_MIN_CATALOG filas. Se
+    revisa con una sola página de prueba y el resultado se reutiliza por
+    SCATTER_PROBE_TTL segundos, así los jobs no pagan un request extra.
+    """
+    global _scatter_probe
+    if SCATTER_SHARDS <= 1:
+        return False
+    if SCATTER_MIN_CATALOG <= 0:
+        return True
+    now = time.monotonic()
+    if _scatter_probe is not None and now - _scatter_probe[0] < SCATTER_PROBE_TTL:
+        return _scatter_probe[1]
+
+    last_row = SCATTER_MIN_CATALOG - 1
+    page = last_row // FETCH_PAGE_LIMIT + 1
+    try:
+        results = _page_results(get_internal_properties(page=page, limit=FETCH_PAGE_LIMIT))
+    except Exception as e:
+        print(f"[Worker] scatter probe failed, using single pass: {e}")
+        return False
+    use = len(results) > last_row % FETCH_PAGE_LIMIT
+    _scatter_probe = (now, use)
+    return use
+
+
+def _tag_rows(page: int, rows: List[Dict[str, Any]]) -> None:
+    offset = (page - 1) * FETCH_PAGE_LIMIT
+    for i, p in enumerate(rows):
+        p["_row"] = offset + i
+
+
+def fetch_shard_pages(shard: int, n_shards: int) -> List[Tuple[int, List[Dict[str, Any]]]]:
+    """Páginas (número, filas) que le tocan al shard, ya marcadas con _row."""
+    pages: List[Tuple[int, List[Dict[str, Any]]]] = []
+    page = shard + 1
+    while True:
+        results = _page_results(get_internal_properties(page=page, limit=FETCH_PAGE_LIMIT))
+        if results:
+            pages.append((page, results))
+        if len(results) < FETCH_PAGE_LIMIT:
+            break
+        page += n_shards
+    rows = sum(len(r) for _, r in pages)
+    print(f"[Worker] fetch_shard_pages: shard={shard}/{n_shards}, pages={len(pages)}, rows={rows}")
+    return pages
+
+
+def merge_top_k(shard_results: List[List[Dict[str, Any]]], k: int = TOP_K) -> List[Dict[str, Any]]:
+    """
+    Junta los top k locales en el top k global, con el mismo criterio
+    que basic_filter_and_rank:
+    - si algún shard tiene distancias finitas, solo esas cuentan y se
+      ordena por (distancia, precio)
+    - si no, todos quedaron ordenados solo por precio
+    Los empates se resuelven por "_row", igual que el sort estable de una
+    pasada sobre el catálogo completo.
     """
-    all_props = fetch_all_properties()
-    recos = basic_filter_and_rank(base_property, all_props)
+    merged = [p for recos in shard_results for p in recos]
+    with_distance = [
+        p for p in merged
+        if p.get("_distance_km") is not None and math.isfinite(p["_distance_km"])
+    ]
+    if with_distance:
+        with_distance.sort(
+            key=lambda x: (
+                x["_distance_km"],
+                _safe_float(x.get("price"), float("inf")),
+                x.get("_row", 0),
+            )
+        )
+        return with_distance[:k]
+
+    merged.sort(key=lambda x: (_safe_float(x.get("price"), float("inf")), x.get("_row", 0)))
+    return merged[:k]
+
+
+def _scatter(base_property: Dict[str, Any], record: Optional[Dict[str, Any]] = None):
+    print(f"[Worker] scatter: shards={SCATTER_SHARDS}")
+    return chord(
+        group(
+            recommend_shard.s(base_property, shard, SCATTER_SHARDS)
+            for shard in range(SCATTER_SHARDS)
+        ),
+        recommend_merge.s(record),
+    )
+
+
+@celery.task(name="tasks.recommend_shard")
+def recommend_shard(base_property: Dict[str, Any], shard: int, n_shards: int):
+    """Top k local de las páginas del shard."""
+    timings: Dict[str, float] = {}
+    with capture.stage(timings, "fetch_ms"):
+        pages = fetch_shard_pages(shard, n_shards)
+
+    # modo captura: un snapshot por página, el replay las vuelve a juntar
+    page_versions = []
+    if capture.CAPTURE_ENABLED:
+        page_versions = [[page, capture.snapshot_catalog(rows)] for page, rows in pages]
+
+    props: List[Dict[str, Any]] = []
+    for page, rows in pages:
+        _tag_rows(page, rows)
+        props.extend(rows)
+
+    geo_api.start_recording()
+    try:
+        with capture.stage(timings, "rank_ms"):
+            recos = basic_filter_and_rank(base_property, props)
+    finally:
+        geocache = geo_api.stop_recording()
+    return {
+        "recommendations": recos,
+        "geocache": geocache,
+        "rows": len(props),
+        "pages": page_versions,
+        "fetch_ms": timings["fetch_ms"],
+        "rank_ms": timings["rank_ms"],
+    }
+
+
+@celery.task(name="tasks.recommend_merge")
+def recommend_merge(shard_results: List[Dict[str, Any]], record: Optional[Dict[str, Any]] = None):
+    """Reducer del chord: top k global y, si se está capturando, el registro del job."""
+    recos = merge_top_k([r["recommendations"] for r in shard_results])
+
+    if record is not None:
+        timings = record["timings"]
+        # el shard más lento es el que marca la latencia de cada etapa
+        timings["fetch_ms"] = max(r["fetch_ms"] for r in shard_results)
+        timings["rank_ms"] = max(r["rank_ms"] for r in shard_results)
+        timings["shard_fetch_ms"] = [r["fetch_ms"] for r in shard_results]
+        timings["shard_rank_ms"] = [r["rank_ms"] for r in shard_results]
+        timings["total_ms"] = round((time.time() - record["ts"]) * 1000, 3)
+        geocache: Dict[str, Any] = {}
+        for r in shard_results:
+            geocache.update(r.get("geocache") or {})
+        pages = sorted(p for r in shard_results for p in r.get("pages") or [])
+        versions = [v for _, v in pages]
+        record["mode"] = "scatter"
+        record["catalog_pages"] = versions
+        record["catalog_version"] = (
+            capture.pages_version(versions) if versions and None not in versions else None
+        )
+        record["catalog_size"] = sum(r["rows"] for r in shard_results)
+        record["geocache"] = geocache
+        record["result"] = _result_ids(recos)
+        capture.capture_job(record)
+
+    return _format_recommendations(recos)
+
+
+def _result_ids(recos: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [{"id": p.get("id"), "distance_km": p.get("_distance_km")} for p in recos]
+
 
+def _format_recommendations(recos: List[Dict[str, Any]]) -> Dict[str, Any]:
     if not recos:
         return {"message": "sin coincidencias", "recommendations": []}
 